@@ -0,0 +1 @@
+default_app_config = 'ask_cfpb.apps.AskCfpbAppConfig'
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class AskCfpbAppConfig(AppConfig):
+    name = 'ask_cfpb'
+    label = 'ask_cfpb'
+    verbose_name = 'Ask CFPB'
+
+    def ready(self):
+        from ask_cfpb.signals import register_signal_handlers
+        register_signal_handlers()
@@ -1,5 +1,10 @@
+import logging
+
+from haystack import connections
+from haystack.constants import DJANGO_CT
 from haystack.query import SearchQuerySet
 
+import elasticsearch
 from flags.state import flag_enabled
 
 
@@ -8,6 +13,10 @@ UNSAFE_CHARACTERS = [
     '<', '>', '[', ']', '{', '}', '\\'
 ]
 
+ANSWER_PAGE_CONTENT_TYPE = 'ask_cfpb.answerpage'
+
+logger = logging.getLogger(__name__)
+
 
 def make_safe(term):
     for char in UNSAFE_CHARACTERS:
@@ -15,6 +24,49 @@ def make_safe(term):
     return term
 
 
+def autocomplete(term, language='en', size=20):
+    """
+    Query the Elasticsearch index directly for answer autocompletions.
+
+    This matches what Haystack's SearchQuerySet.autocomplete does for
+    AnswerPages, but reads only the fields we return instead of building a
+    SearchResult object for every hit.
+    """
+    backend = connections['default'].get_backend()
+    body = {
+        'query': {
+            'bool': {
+                'must': [
+                    {'match': {
+                        'autocomplete': {'query': term, 'operator': 'and'}
+                    }},
+                ],
+                'filter': [
+                    {'term': {DJANGO_CT: ANSWER_PAGE_CONTENT_TYPE}},
+                    {'match': {'language': language}},
+                ],
+            }
+        },
+        '_source': ['autocomplete', 'url'],
+        'size': size,
+    }
+    try:
+        response = backend.conn.search(index=backend.index_name, body=body)
+    except elasticsearch.TransportError:
+        # Fail the way Haystack's own search does (SILENTLY_FAIL).
+        if not backend.silently_fail:
+            raise
+        logger.exception('Failed to query Elasticsearch for autocomplete')
+        return []
+    return [
+        {
+            'question': hit['_source']['autocomplete'],
+            'url': hit['_source']['url'],
+        }
+        for hit in response['hits']['hits']
+    ]
+
+
 class AskSearch:
     def __init__(self, search_term, query_base=None, language='en'):
         self.query_base = query_base or SearchQuerySet().filter(
@@ -0,0 +1,24 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from wagtail.core.models import Site
+from wagtailsharing.models import SharingSite
+
+from ask_cfpb.views import (
+    DEFAULT_ROOT_URL_CACHE_KEY, SHARING_HOSTNAMES_CACHE_KEY
+)
+
+
+def clear_default_root_url(sender, **kwargs):
+    cache.delete(DEFAULT_ROOT_URL_CACHE_KEY)
+
+
+def clear_sharing_hostnames(sender, **kwargs):
+    cache.delete(SHARING_HOSTNAMES_CACHE_KEY)
+
+
+def register_signal_handlers():
+    post_save.connect(clear_default_root_url, sender=Site)
+    post_delete.connect(clear_default_root_url, sender=Site)
+    post_save.connect(clear_sharing_hostnames, sender=SharingSite)
+    post_delete.connect(clear_sharing_hostnames, sender=SharingSite)
@@ -66,6 +66,12 @@ def mock_queryset(count=0):
         def count(self):
             return count
 
+        def __len__(self):
+            return count
+
+        def __getitem__(self, k):
+            return list(iter(self))[k]
+
         def filter(self, *args, **kwargs):
             return self
 
@@ -1,29 +1,43 @@
 import json
 import unittest
+from datetime import timedelta
 
 from django.apps import apps
+from django.core.cache import cache
 from django.http import Http404, HttpRequest, QueryDict
 from django.test import TestCase, override_settings
 from django.urls import NoReverseMatch, reverse
 from django.utils import timezone
+from django.utils.http import http_date
 
 from wagtail.core.models import Site
 from wagtailsharing.models import SharingSite
 
+import elasticsearch
 import mock
 from model_bakery import baker
 
 from ask_cfpb.models import (
     ENGLISH_PARENT_SLUG, SPANISH_PARENT_SLUG, AnswerPage
 )
-from ask_cfpb.models.search import make_safe
-from ask_cfpb.tests.models.test_pages import mock_queryset
-from ask_cfpb.views import annotate_links, ask_search, redirect_ask_search
+from ask_cfpb.models.search import autocomplete, make_safe
+from ask_cfpb.tests.models.test_pages import MockSearchResult, mock_queryset
+from ask_cfpb.views import (
+    SEARCH_RESULTS_BATCH_SIZE, annotate_links, ask_search, redirect_ask_search
+)
 from v1.util.migrations import get_or_create_page
 
 
 now = timezone.now()
 
+# A cache of its own, so cached values can't leak into other test modules.
+LOCMEM_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "ask-cfpb-test-views",
+    }
+}
+
 
 class AskSearchSafetyCase(unittest.TestCase):
     def test_make_safe(self):
@@ -32,6 +46,49 @@ class AskSearchSafetyCase(unittest.TestCase):
             make_safe(test_phrase), "Would you like green eggs and ?"
         )
 
+    @mock.patch("ask_cfpb.models.search.connections")
+    def test_autocomplete(self, mock_connections):
+        backend = mock_connections["default"].get_backend.return_value
+        backend.index_name = "test_index"
+        backend.conn.search.return_value = {
+            "hits": {
+                "hits": [
+                    {"_source": {"autocomplete": "question", "url": "url"}}
+                ]
+            }
+        }
+        results = autocomplete("quest", language="es")
+        self.assertEqual(results, [{"question": "question", "url": "url"}])
+        kwargs = backend.conn.search.call_args[1]
+        self.assertEqual(kwargs["index"], "test_index")
+        self.assertEqual(kwargs["body"]["size"], 20)
+        self.assertIn(
+            {"match": {"language": "es"}},
+            kwargs["body"]["query"]["bool"]["filter"],
+        )
+
+    @mock.patch("ask_cfpb.models.search.connections")
+    def test_autocomplete_elasticsearch_error(self, mock_connections):
+        backend = mock_connections["default"].get_backend.return_value
+        backend.silently_fail = True
+        backend.conn.search.side_effect = elasticsearch.ConnectionError(
+            "N/A", "Connection refused"
+        )
+        with self.assertLogs("ask_cfpb.models.search", "ERROR"):
+            self.assertEqual(autocomplete("quest"), [])
+
+    @mock.patch("ask_cfpb.models.search.connections")
+    def test_autocomplete_elasticsearch_error_not_silenced(
+        self, mock_connections
+    ):
+        backend = mock_connections["default"].get_backend.return_value
+        backend.silently_fail = False
+        backend.conn.search.side_effect = elasticsearch.TransportError(
+            500, "error"
+        )
+        with self.assertRaises(elasticsearch.TransportError):
+            autocomplete("quest")
+
 
 class AnswerPagePreviewCase(TestCase):
     def setUp(self):
@@ -105,17 +162,73 @@ class AnswerPagePreviewCase(TestCase):
         view_answer(test_request, "test-question1", "en", self.test_answer.pk)
         self.assertEqual(mock_serve.call_count, 1)
 
+    @mock.patch("ask_cfpb.views.SharingSite.find_for_request")
+    @mock.patch("ask_cfpb.views.ServeView.serve")
+    def test_public_host_skips_sharing_site_lookup(
+        self, mock_serve, mock_find
+    ):
+        from ask_cfpb.views import view_answer
+
+        test_request = HttpRequest()
+        test_request.META["SERVER_NAME"] = "localhost"
+        test_request.META["SERVER_PORT"] = 8000
+        view_answer(test_request, "test-question1", "en", self.test_answer.pk)
+        mock_find.assert_not_called()
+        mock_serve.assert_not_called()
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_sharing_hostnames_cached_until_sharing_site_saved(self):
+        from ask_cfpb.views import get_sharing_hostnames
+
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.assertEqual(get_sharing_hostnames(), {"preview.localhost"})
+        with self.assertNumQueries(0):
+            get_sharing_hostnames()
+
+        self.sharing_site.hostname = "draft.localhost"
+        self.sharing_site.save()
+        self.assertEqual(get_sharing_hostnames(), {"draft.localhost"})
+
     def test_answer_page_not_live(self):
         from ask_cfpb.views import view_answer
 
         page = self.test_answer.english_page
         page.unpublish()
         test_request = HttpRequest()
+        test_request.META["SERVER_NAME"] = "localhost"
+        test_request.META["SERVER_PORT"] = 8000
         with self.assertRaises(Http404):
             view_answer(
                 test_request, "test-question", "en", self.test_answer.pk
             )
 
+    def test_answer_page_not_live_conditional_get(self):
+        url = self.english_answer_page.url
+        self.english_answer_page.unpublish()
+        response = self.client.get(
+            url,
+            HTTP_IF_MODIFIED_SINCE=http_date(
+                (now + timedelta(days=1)).timestamp()
+            ),
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_answer_page_revalidated_by_content(self):
+        response = self.client.get(self.english_answer_page.url)
+        self.assertNotIn("Last-Modified", response)
+        self.assertIn("ETag", response)
+
+    def test_missing_answer_page_uses_one_query(self):
+        from ask_cfpb.views import view_answer
+
+        test_request = HttpRequest()
+        test_request.META["SERVER_NAME"] = "localhost"
+        test_request.META["SERVER_PORT"] = 8000
+        with self.assertNumQueries(1):
+            with self.assertRaises(Http404):
+                view_answer(test_request, "no-question", "en", 999999)
+
     def test_page_redirected(self):
         page = self.english_answer_page
         page.get_latest_revision().publish()
@@ -165,11 +278,48 @@ class AnswerViewTestCase(TestCase):
         )
         self.assertEqual(links, [(1, str("http://fake.com"))])
 
+    def test_annotate_links_keeps_trailing_text(self):
+        mock_answer = (
+            '<p>See <a href="/one/">one</a> and <a href="/two/">two</a>.</p>'
+        )
+        (annotated_answer, links) = annotate_links(mock_answer)
+        self.assertEqual(
+            annotated_answer,
+            '<html><body><p>See <a href="/one/">one</a><sup>1</sup> and '
+            '<a href="/two/">two</a><sup>2</sup>.</p></body></html>',
+        )
+        self.assertEqual(len(links), 2)
+
     def test_annotate_links_no_href(self):
         mock_answer = "<p>Answer with a <a>fake link.</a></p>"
         (annotated_answer, links) = annotate_links(mock_answer)
         self.assertEqual(links, [])
 
+    def test_annotate_links_whitespace_only(self):
+        self.assertEqual(annotate_links(" \n "), (" \n ", []))
+
+    def test_annotate_links_comment_only(self):
+        self.assertEqual(
+            annotate_links("<!-- draft -->"), ("<!-- draft -->", [])
+        )
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_annotate_links_caches_default_site(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        site = Site.objects.get(is_default_site=True)
+        site.save()
+        annotate_links('<a href="/one/">one</a>')
+        with self.assertNumQueries(0):
+            (_, links) = annotate_links('<a href="/one/">one</a>')
+        self.assertEqual(links, [(1, site.root_url + "/one/")])
+
+        site.hostname = "example.com"
+        site.port = 80
+        site.save()
+        (_, links) = annotate_links('<a href="/one/">one</a>')
+        self.assertEqual(links, [(1, "http://example.com/one/")])
+
     def test_annotate_links_no_site(self):
         site = Site.objects.get(is_default_site=True)
         site.is_default_site = False
@@ -214,6 +364,52 @@ class AnswerViewTestCase(TestCase):
             mock_ask_search.called_with(language="en", search_term="payday")
         )
 
+    def _search_backend_requests(self, hits):
+        """Run a JSON search and return the mocked Elasticsearch calls."""
+        get_or_create_page(
+            apps,
+            "ask_cfpb",
+            "AnswerResultsPage",
+            "Mock results page",
+            "ask-cfpb-search-results",
+            self.ROOT_PAGE,
+            language="en",
+        )
+
+        def search(query_string, start_offset=0, end_offset=None, **kwargs):
+            end_offset = min(end_offset or hits, hits)
+            return {
+                "results": [
+                    MockSearchResult("ask_cfpb", "AnswerPage", i, 0.5)
+                    for i in range(start_offset + 1, end_offset + 1)
+                ],
+                "hits": hits,
+            }
+
+        with mock.patch(
+            "search.backends.CFGOVElasticsearch2SearchBackend.search",
+            side_effect=search,
+        ) as mock_search:
+            response = self.client.get(
+                reverse("ask-search-en-json", kwargs={"as_json": "json"}),
+                {"q": "payday"},
+            )
+
+        self.assertEqual(len(json.loads(response.content)["results"]), hits)
+        return mock_search.call_args_list
+
+    def test_en_search_fetches_results_in_one_request(self):
+        self.assertEqual(len(self._search_backend_requests(hits=3)), 1)
+
+    def test_en_search_fetches_large_results_in_two_requests(self):
+        requests = self._search_backend_requests(
+            hits=SEARCH_RESULTS_BATCH_SIZE + 5
+        )
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(
+            requests[1][1]["start_offset"], SEARCH_RESULTS_BATCH_SIZE
+        )
+
     @mock.patch("ask_cfpb.views.AskSearch")
     def test_en_search_no_term(self, mock_ask_search):
         from v1.util.migrations import get_or_create_page
@@ -275,14 +471,15 @@ class AnswerViewTestCase(TestCase):
         redirect_ask_search(request)
         self.assertEqual(mock_redirect.call_count, 1)
 
-    @mock.patch("ask_cfpb.views.redirect")
-    def test_spanish_redirect_ask_search_passes_query_string(
-        self, mock_redirect
-    ):
+    def test_spanish_redirect_ask_search_passes_query_string(self):
         request = HttpRequest()
         request.GET["selected_facets"] = "category_exact:my_categoria"
-        redirect_ask_search(request, language="es")
-        self.assertEqual(mock_redirect.call_count, 1)
+        result = redirect_ask_search(request, language="es")
+        self.assertEqual(result.status_code, 301)
+        self.assertEqual(
+            result.get("location"),
+            "/es/obtener-respuestas/categoria-my_categoria/",
+        )
 
     @mock.patch("ask_cfpb.views.AskSearch")
     def test_es_search(self, mock_ask_search):
@@ -380,6 +577,57 @@ class AnswerViewTestCase(TestCase):
         self.assertEqual(mock_filter.call_count, 1)
         self.assertEqual(json.loads(response.content)["query"], "tuition")
 
+    @override_settings(CACHES=LOCMEM_CACHES)
+    @mock.patch("ask_cfpb.views.AskSearch")
+    def test_json_response_cached(self, mock_ask_search):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        get_or_create_page(
+            apps,
+            "ask_cfpb",
+            "AnswerResultsPage",
+            "Mock results page",
+            "ask-cfpb-search-results",
+            self.english_parent_page,
+            language="en",
+            live=True,
+        )
+        search = mock_ask_search.return_value
+        search.queryset = mock_queryset(count=2)
+        search.suggestion = None
+        search.search_term = "tuition"
+        url = reverse("ask-search-en-json", kwargs={"as_json": "json"})
+        first = self.client.get(url, {"q": "tuition"})
+        second = self.client.get(url, {"q": "tuition"})
+        self.assertEqual(mock_ask_search.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.client.get(url, {"q": "tuition", "correct": "0"})
+        self.assertEqual(mock_ask_search.call_count, 2)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    @mock.patch("ask_cfpb.views.AskSearch")
+    def test_json_response_without_results_not_cached(self, mock_ask_search):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        get_or_create_page(
+            apps,
+            "ask_cfpb",
+            "AnswerResultsPage",
+            "Mock results page",
+            "ask-cfpb-search-results",
+            self.english_parent_page,
+            language="en",
+            live=True,
+        )
+        search = mock_ask_search.return_value
+        search.queryset = mock_queryset(count=0)
+        search.suggestion = None
+        search.search_term = "tuition"
+        url = reverse("ask-search-en-json", kwargs={"as_json": "json"})
+        self.client.get(url, {"q": "tuition"})
+        self.client.get(url, {"q": "tuition"})
+        self.assertEqual(mock_ask_search.call_count, 2)
+
     def test_autocomplete_en_blank_term(self):
         result = self.client.get(reverse("ask-autocomplete-en"), {"term": ""})
         output = json.loads(result.content)
@@ -393,6 +641,21 @@ class AnswerViewTestCase(TestCase):
         output = json.loads(result.content)
         self.assertEqual(output, [])
 
+    @mock.patch("ask_cfpb.views.autocomplete")
+    def test_autocomplete_en_native(self, mock_autocomplete):
+        mock_autocomplete.return_value = [
+            {"question": "question", "url": "url"}
+        ]
+        result = self.client.get(
+            reverse("ask-autocomplete-en"), {"term": "question"}
+        )
+        mock_autocomplete.assert_called_once_with("question", language="en")
+        output = json.loads(result.content)
+        self.assertEqual(sorted(output[0].keys()), ["question", "url"])
+
+    @override_settings(
+        FLAGS={"ASK_AUTOCOMPLETE_HAYSTACK": [("boolean", True)]}
+    )
     @mock.patch("ask_cfpb.views.SearchQuerySet.autocomplete")
     def test_autocomplete_en(self, mock_autocomplete):
         mock_search_result = mock.Mock()
@@ -406,6 +669,9 @@ class AnswerViewTestCase(TestCase):
         output = json.loads(result.content)
         self.assertEqual(sorted(output[0].keys()), ["question", "url"])
 
+    @override_settings(
+        FLAGS={"ASK_AUTOCOMPLETE_HAYSTACK": [("boolean", True)]}
+    )
     @mock.patch("ask_cfpb.views.SearchQuerySet.autocomplete")
     def test_autocomplete_es(self, mock_autocomplete):
         mock_search_result = mock.Mock()
@@ -420,6 +686,25 @@ class AnswerViewTestCase(TestCase):
         output = json.loads(result.content)
         self.assertEqual(sorted(output[0].keys()), ["question", "url"])
 
+    @mock.patch("ask_cfpb.views.autocomplete")
+    def test_autocomplete_not_modified(self, mock_autocomplete):
+        mock_autocomplete.return_value = []
+        url = reverse("ask-autocomplete-en")
+        result = self.client.get(url, {"term": "question"})
+        self.assertIn("max-age=60", result["Cache-Control"])
+        result = self.client.get(
+            url, {"term": "question"}, HTTP_IF_NONE_MATCH=result["ETag"]
+        )
+        self.assertEqual(result.status_code, 304)
+
+        mock_autocomplete.return_value = [
+            {"question": "question", "url": "url"}
+        ]
+        result = self.client.get(
+            url, {"term": "question"}, HTTP_IF_NONE_MATCH=result["ETag"]
+        )
+        self.assertEqual(result.status_code, 200)
+
 
 class RedirectAskSearchTestCase(TestCase):
     def test_redirect_search_no_facets(self):
@@ -477,6 +762,14 @@ class RedirectAskSearchTestCase(TestCase):
             result.get("location"), "/ask-cfpb/audience-older-americans/"
         )
 
+    def test_spanish_redirect_search_with_audience(self):
+        request = HttpRequest()
+        request.GET["selected_facets"] = "audience_exact:Older+Americans"
+        result = redirect_ask_search(request, language="es")
+        self.assertEqual(
+            result.get("location"), "/ask-cfpb/audience-older-americans/"
+        )
+
     def test_spanish_redirect_search_with_tag(self):
         target_tag = "spanishtag1"
         tag_querystring = (
@@ -507,6 +800,27 @@ class RedirectAskSearchTestCase(TestCase):
             "/ask-cfpb/search-by-tag/{}/".format(target_tag),
         )
 
+    def test_redirect_search_tag_separators(self):
+        request = HttpRequest()
+        request.GET["selected_facets"] = "tag_exact:my tag%20with+seps"
+        result = redirect_ask_search(request)
+        self.assertEqual(
+            result.get("location"),
+            "/ask-cfpb/search-by-tag/my_tag_with_seps/",
+        )
+
+    def test_redirect_search_skips_blank_facet_values(self):
+        querystring = (
+            "selected_facets=category_exact:"
+            "&selected_facets=tag_exact:mytag1"
+        )
+        request = HttpRequest()
+        request.GET = QueryDict(querystring)
+        result = redirect_ask_search(request)
+        self.assertEqual(
+            result.get("location"), "/ask-cfpb/search-by-tag/mytag1/"
+        )
+
     def test_redirect_search_with_unrecognized_facet_raises_404(self):
         querystring = (
             "sort=-updated_at&selected_facets=imtkfidycqszgfdb&page=60"
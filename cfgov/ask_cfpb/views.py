@@ -1,18 +1,62 @@
-import json
+import hashlib
+import re
+from functools import lru_cache
 from urllib.parse import urljoin
 
-from django.http import Http404, HttpResponse, JsonResponse
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponsePermanentRedirect
 from django.shortcuts import get_object_or_404, redirect
 from django.template.defaultfilters import slugify
+from django.views.decorators.cache import cache_control
 from haystack.query import SearchQuerySet
 
 from wagtail.core.models import Site
 from wagtailsharing.models import SharingSite
 from wagtailsharing.views import ServeView
 
-from bs4 import BeautifulSoup as bs
+import orjson
+from flags.state import flag_enabled
+from lxml import etree, html
 
 from ask_cfpb.models import AnswerPage, AnswerResultsPage, AskSearch
+from ask_cfpb.models.search import autocomplete
+
+
+_EMPTY_JSON = b'[]'
+
+SEARCH_JSON_CACHE_TIMEOUT = 60 * 5
+
+# Most searches match fewer answers than this, so they need one request.
+SEARCH_RESULTS_BATCH_SIZE = 100
+
+# Site settings are cached briefly so that changes made through another
+# worker or host are picked up without a restart.
+SITE_SETTINGS_CACHE_TIMEOUT = 60
+
+DEFAULT_ROOT_URL_CACHE_KEY = 'ask_cfpb_default_root_url'
+SHARING_HOSTNAMES_CACHE_KEY = 'ask_cfpb_sharing_hostnames'
+
+
+def _json_response(data):
+    return HttpResponse(orjson.dumps(data), content_type='application/json')
+
+
+def get_default_root_url():
+    return cache.get_or_set(
+        DEFAULT_ROOT_URL_CACHE_KEY,
+        lambda: Site.objects.get(is_default_site=True).root_url,
+        SITE_SETTINGS_CACHE_TIMEOUT
+    )
+
+
+def get_sharing_hostnames():
+    return cache.get_or_set(
+        SHARING_HOSTNAMES_CACHE_KEY,
+        lambda: frozenset(
+            SharingSite.objects.values_list('hostname', flat=True)
+        ),
+        SITE_SETTINGS_CACHE_TIMEOUT
+    )
 
 
 def annotate_links(answer_text):
@@ -23,45 +67,70 @@ def annotate_links(answer_text):
     and an enumerated list of links as footnotes.
     """
     try:
-        _site = Site.objects.get(is_default_site=True)
+        root_url = get_default_root_url()
     except Site.DoesNotExist:
         raise RuntimeError('no default wagtail site configured')
 
     footnotes = []
-    soup = bs(answer_text, 'lxml')
-    links = soup.findAll('a')
+    if not answer_text:
+        return (answer_text, footnotes)
+    try:
+        root = html.document_fromstring(answer_text)
+    except etree.ParserError:
+        # lxml refuses text with no elements in it, like whitespace or a
+        # lone comment, so there's nothing to annotate.
+        return (answer_text, footnotes)
     index = 1
-    for link in links:
-        if not link.get('href'):
+    for link in root.iter('a'):
+        href = link.get('href')
+        if not href:
             continue
-        footnotes.append(
-            (index, urljoin(_site.root_url, link.get('href'))))
-        parent = link.parent
-        link_location = parent.index(link)
-        super_tag = soup.new_tag('sup')
-        super_tag.string = str(index)
-        parent.insert(link_location + 1, super_tag)
+        footnotes.append((index, urljoin(root_url, href)))
+        super_tag = etree.Element('sup')
+        super_tag.text = str(index)
+        # The link's tail text belongs after the new <sup>, not before it.
+        super_tag.tail, link.tail = link.tail, None
+        link.addnext(super_tag)
         index += 1
-    return (str(soup), footnotes)
+    return (html.tostring(root, encoding='unicode'), footnotes)
+
+
+def _get_answer_row(language, answer_id):
+    """
+    Look up the few AnswerPage fields view_answer needs to decide how to
+    respond, without loading the whole page.
+    """
+    return AnswerPage.objects.filter(
+        language=language, answer_base__id=answer_id
+    ).values('pk', 'live', 'redirect_to_page_id', 'slug').first()
 
 
 def view_answer(request, slug, language, answer_id):
-    answer_page = get_object_or_404(
-        AnswerPage, language=language, answer_base__id=answer_id)
-    if answer_page.live is False:
+    row = _get_answer_row(language, answer_id)
+    if not row or not row['live']:
         raise Http404
-    if answer_page.redirect_to_page:
-        new_page = answer_page.redirect_to_page
+    if row['redirect_to_page_id']:
+        new_page = AnswerPage.objects.get(pk=row['redirect_to_page_id'])
         return redirect(new_page.url, permanent=True)
-    if "{}-{}-{}".format(slug, language, answer_id) != answer_page.slug:
+    if "{}-{}-{}".format(slug, language, answer_id) != row['slug']:
+        answer_page = AnswerPage.objects.get(pk=row['pk'])
         return redirect(answer_page.url, permanent=True)
 
     # We don't want to call answer_page.serve(request) here because that
     # would bypass wagtail-sharing logic that allows for review of draft
-    # revisions via a sharing site.
-    try:
-        sharing_site = SharingSite.find_for_request(request)
-    except SharingSite.DoesNotExist:
+    # revisions via a sharing site. Most requests don't come through a
+    # sharing site, so check the hostname before looking one up.
+    hostname = request.get_host().split(':')[0]
+
+    sharing_site = None
+    if hostname in get_sharing_hostnames():
+        try:
+            sharing_site = SharingSite.find_for_request(request)
+        except SharingSite.DoesNotExist:
+            pass
+
+    if sharing_site is None:
+        answer_page = AnswerPage.objects.get(pk=row['pk'])
         return answer_page.serve(request)
 
     page, args, kwargs = ServeView.route(
@@ -73,6 +142,31 @@ def view_answer(request, slug, language, answer_id):
     return ServeView.serve(page, request, args, kwargs)
 
 
+def _fetch_search_results(queryset):
+    """Fetch every result of a search, usually in a single request.
+
+    Iterating or calling len() on a fresh SearchQuerySet costs a separate
+    count request, and iteration then fetches results ten at a time.
+    Slicing fetches a batch in one request, which also reports the total.
+    """
+    results = queryset[:SEARCH_RESULTS_BATCH_SIZE]
+    total = len(queryset)
+    if total > len(results):
+        results = results + queryset[len(results):total]
+    return results
+
+
+def _search_json_cache_key(request, search_term, language):
+    # Spelling suggestions depend on the request, so they are part of the key.
+    suggest = '{:d}{:d}'.format(
+        request.GET.get('correct', '1') == '1',
+        flag_enabled('ASK_SEARCH_TYPOS', request=request),
+    )
+    term_hash = hashlib.blake2b(
+        search_term.encode(), digest_size=12).hexdigest()
+    return 'ask_search_json:{}:{}:{}'.format(language, suggest, term_hash)
+
+
 def ask_search(request, language='en', as_json=False):
     if 'selected_facets' in request.GET:
         return redirect_ask_search(request, language=language)
@@ -93,12 +187,20 @@ def ask_search(request, language='en', as_json=False):
         results_page.result_query = ''
         return results_page.serve(request)
 
+    if as_json:
+        cache_key = _search_json_cache_key(request, search_term, language)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return HttpResponse(cached, content_type='application/json')
+
     search = AskSearch(search_term=search_term, language=language)
-    if search.queryset.count() == 0:
+    results = _fetch_search_results(search.queryset)
+    if not results:
         search.suggest(request=request)
+        results = _fetch_search_results(search.queryset)
 
     if as_json:
-        results = {
+        response = _json_response({
             'query': search_term,
             'result_query': search.search_term,
             'suggestion': search.suggestion,
@@ -109,27 +211,38 @@ def ask_search(request, language='en', as_json=False):
                     'text': result.text,
                     'preview': result.preview,
                 }
-                for result in search.queryset
+                for result in results
             ]
-        }
-        json_results = json.dumps(results)
-        return HttpResponse(json_results, content_type='application/json')
+        })
+        # Haystack returns no results when Elasticsearch fails, so don't
+        # keep serving an empty list once it recovers.
+        if results:
+            cache.set(cache_key, response.content, SEARCH_JSON_CACHE_TIMEOUT)
+        return response
 
     results_page.query = search_term
     results_page.result_query = search.search_term
     results_page.suggestion = search.suggestion
     results_page.answers = [
         (result.url, result.autocomplete, result.preview)
-        for result in search.queryset
+        for result in results
     ]
     return results_page.serve(request)
 
 
+def _autocomplete_term(request):
+    return request.GET.get('term', '').strip().replace('<', '')
+
+
+@cache_control(public=True, max_age=60, stale_while_revalidate=300)
 def ask_autocomplete(request, language='en'):
-    term = request.GET.get(
-        'term', '').strip().replace('<', '')
+    term = _autocomplete_term(request)
     if not term:
-        return JsonResponse([], safe=False)
+        return HttpResponse(_EMPTY_JSON, content_type='application/json')
+
+    if not flag_enabled('ASK_AUTOCOMPLETE_HAYSTACK', request=request):
+        results = autocomplete(term, language=language)
+        return _json_response(results)
 
     try:
         sqs = SearchQuerySet().models(AnswerPage)
@@ -140,9 +253,37 @@ def ask_autocomplete(request, language='en'):
         results = [{'question': result.autocomplete,
                     'url': result.url}
                    for result in sqs[:20]]
-        return JsonResponse(results, safe=False)
+        return _json_response(results)
     except IndexError:
-        return JsonResponse([], safe=False)
+        return HttpResponse(_EMPTY_JSON, content_type='application/json')
+
+
+_FACET_RE = re.compile(
+    r'(?P<kind>category|audience|tag)_exact:(?P<value>.+)', re.DOTALL)
+
+# Legacy tags used spaces, plus signs, or a literal '%20' between words.
+_TAG_TRANSLATION = str.maketrans({' ': '_', '+': '_'})
+
+_FACET_REDIRECTS = {
+    ('category', 'en'): '/ask-cfpb/category-{}/',
+    ('category', 'es'): '/es/obtener-respuestas/categoria-{}/',
+    # We currently only offer audience pages to English users.
+    ('audience', 'en'): '/ask-cfpb/audience-{}/',
+    ('audience', 'es'): '/ask-cfpb/audience-{}/',
+    # Tags are passed with underscore separators.
+    ('tag', 'en'): '/ask-cfpb/search-by-tag/{}/',
+    ('tag', 'es'): '/es/obtener-respuestas/buscar-por-etiqueta/{}/',
+}
+
+
+@lru_cache(maxsize=256)
+def _slugify_facet(value):
+    return slugify(value)
+
+
+def _redirect_to_facet(kind, value, language):
+    url_format = _FACET_REDIRECTS[kind, language]
+    return HttpResponsePermanentRedirect(url_format.format(value))
 
 
 def redirect_ask_search(request, language='en'):
@@ -166,9 +307,6 @@ def redirect_ask_search(request, language='en'):
     - selected_facets=audience_exact
     - selected_facets=tag_exact:
     """
-    category_facet = 'category_exact:'
-    audience_facet = 'audience_exact:'
-    tag_facet = 'tag_exact:'
     if request.GET.get('q'):
         querystring = request.GET.get('q').strip()
         if not querystring:
@@ -182,58 +320,29 @@ def redirect_ask_search(request, language='en'):
             return redirect(
                 '/ask-cfpb/search/', permanent=True)
 
-        def redirect_to_category(category, language):
-            if language == 'es':
-                return redirect(
-                    '/es/obtener-respuestas/categoria-{category}/'.format(
-                        category=category), permanent=True)
-            return redirect(
-                '/ask-cfpb/category-{category}/'.format(
-                    category=category), permanent=True)
-
-        def redirect_to_audience(audience):
-            """We currently only offer audience pages to English users."""
-            return redirect(
-                '/ask-cfpb/audience-{audience}/'.format(
-                    audience=audience), permanent=True)
-
-        def redirect_to_tag(tag, language):
-            """Handle tags passed with underscore separators."""
-            if language == 'es':
-                return redirect(
-                    '/es/obtener-respuestas/buscar-por-etiqueta/{tag}/'.format(
-                        tag=tag), permanent=True)
-            else:
-                return redirect(
-                    '/ask-cfpb/search-by-tag/{tag}/'.format(
-                        tag=tag), permanent=True)
-
-        # Redirect by facet value, if there is one, starting with category.
-        # We want to exhaust facets each time, so we need three loops.
-        # We act only on the first of any facet type found.
+        # Collect the first non-blank value of each facet type in one pass.
+        # We act only on the first of any facet type found, in order of
+        # category, audience, and then tag.
         # Most search redirects will find a category and return.
+        found = {}
         for facet in facets:
-            if category_facet in facet:
-                category = facet.replace(category_facet, '')
-                if category:
-                    slug = slugify(category)  # handle uppercase and spaces
-                    return redirect_to_category(slug, language)
-
-        for facet in facets:
-            if audience_facet in facet:
-                audience_raw = facet.replace(audience_facet, '')
-                if audience_raw:
-                    audience = slugify(audience_raw.replace('+', '-'))
-                    return redirect_to_audience(audience)
-
-        for facet in facets:
-            if tag_facet in facet:
-                raw_tag = facet.replace(tag_facet, '')
-                if raw_tag:
-                    tag = raw_tag.replace(
-                        ' ', '_').replace(
-                        '%20', '_').replace(
-                        '+', '_')
-                    return redirect_to_tag(tag, language)
+            match = _FACET_RE.match(facet)
+            if match:
+                found.setdefault(match.group('kind'), match.group('value'))
+
+        if 'category' in found:
+            # handle uppercase and spaces
+            return _redirect_to_facet(
+                'category', _slugify_facet(found['category']), language)
+
+        if 'audience' in found:
+            return _redirect_to_facet(
+                'audience',
+                _slugify_facet(found['audience'].replace('+', '-')),
+                language)
+
+        if 'tag' in found:
+            tag = found['tag'].replace('%20', '_').translate(_TAG_TRANSLATION)
+            return _redirect_to_facet('tag', tag, language)
 
         raise Http404
@@ -613,6 +613,10 @@ FLAGS = {
     # When enabled, spelling suggestions will appear in Ask CFPB search and
     # will be used when the given search term provides no results
     "ASK_SEARCH_TYPOS": [],
+    # Ask CFPB autocomplete through Haystack
+    # When enabled, autocomplete queries go through Haystack's SearchQuerySet
+    # instead of querying Elasticsearch directly
+    "ASK_AUTOCOMPLETE_HAYSTACK": [],
     # Beta banner, seen on beta.consumerfinance.gov
     # When enabled, a banner appears across the top of the site proclaiming
     # "This beta site is a work in progress."
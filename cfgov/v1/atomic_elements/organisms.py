@@ -1,12 +1,11 @@
 import itertools
 import json
-from collections import Counter
-from urllib.parse import urlencode
+from urllib.parse import quote_plus
 
 from django import forms
 from django.apps import apps
 from django.core.exceptions import ValidationError
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.forms.utils import ErrorList
 from django.template.loader import render_to_string
 from django.utils.functional import cached_property
@@ -29,6 +28,12 @@ from v1.atomic_elements import atoms, molecules
 from v1.util import ref
 
 
+# Choice values that block logic compares against.
+_FMT_2575 = '25-75'
+_SORT_FREQ = 'sort_by_frequency'
+_SORT_ALPHA = 'sort_alphabetically'
+
+
 class AskSearch(blocks.StructBlock):
     show_label = blocks.BooleanBlock(
         default=True,
@@ -61,7 +66,7 @@ class WellWithAskSearch(Well):
     ask_search = AskSearch()
 
 
-class InfoUnitGroup(blocks.StructBlock):
+class InfoUnitGroup(v1_blocks.CachedTemplateMixin, blocks.StructBlock):
     format = blocks.ChoiceBlock(
         choices=[
             ('50-50', '50/50'),
@@ -131,18 +136,20 @@ class InfoUnitGroup(blocks.StructBlock):
             )
 
         # If 25/75, info units must have images.
-        if cleaned.get('format') == '25-75':
-            for unit in cleaned.get('info_units'):
-                if not unit['image']['upload']:
-                    raise ValidationError(
-                        ('Validation error in InfoUnitGroup: '
-                         '25-75 with no image'),
-                        params={'format': ErrorList([
-                            'Info units must include images when using the '
-                            '25/75 format. Search for an "FPO" image if you '
-                            'need a temporary placeholder.'
-                        ])}
-                    )
+        info_units = cleaned.get('info_units') or ()
+        if (
+            info_units and
+            cleaned.get('format') == _FMT_2575 and
+            not all(unit['image']['upload'] for unit in info_units)
+        ):
+            raise ValidationError(
+                'Validation error in InfoUnitGroup: 25-75 with no image',
+                params={'format': ErrorList([
+                    'Info units must include images when using the '
+                    '25/75 format. Search for an "FPO" image if you '
+                    'need a temporary placeholder.'
+                ])}
+            )
 
         return cleaned
 
@@ -162,7 +169,7 @@ class PostPreviewSnapshot(blocks.StructBlock):
         template = '_includes/organisms/post-preview-snapshot.html'
 
 
-class EmailSignUp(blocks.StructBlock):
+class EmailSignUp(v1_blocks.CachedTemplateMixin, blocks.StructBlock):
     heading = blocks.CharBlock(required=False, default='Stay informed')
     default_heading = blocks.BooleanBlock(
         required=False,
@@ -231,7 +238,30 @@ class RegComment(blocks.StructBlock):
         template = '_includes/organisms/reg-comment.html'
 
 
-class RelatedPosts(blocks.StructBlock):
+def get_pages_by_slug(slugs):
+    """Look up pages with unique site-wide slugs using a single query.
+
+    Returns a dict of pages keyed by slug. Only the fields needed to filter
+    on a page's children or to generate its URL are loaded. If any of the
+    slugs does not match a page, this raises Page.DoesNotExist.
+    """
+    pages = {
+        page.slug: page
+        for page in Page.objects.filter(slug__in=slugs).only(
+            'slug', 'path', 'depth', 'url_path'
+        )
+    }
+
+    missing = set(slugs) - set(pages)
+    if missing:
+        raise Page.DoesNotExist(
+            'No page with slug: %s' % ', '.join(sorted(missing))
+        )
+
+    return pages
+
+
+class RelatedPosts(v1_blocks.CachedTemplateMixin, blocks.StructBlock):
     limit = blocks.CharBlock(
         default='3',
         help_text=('This limit applies to EACH TYPE of post this module '
@@ -299,28 +329,37 @@ class RelatedPosts(blocks.StructBlock):
         page = context['page']
         request = context['request']
 
+        # Both the posts and the "View more" URL depend on the page's tags,
+        # so fetch them once for both.
+        tags = list(page.tags.values_list('pk', 'slug'))
+
         context.update({
-            'posts': self.related_posts(page, value),
+            'posts': self.related_posts(page, value, tags=tags),
             'view_more_url': (
                 value['alternate_view_more_url'] or
-                self.view_more_url(page, request)
+                self.view_more_url(page, request, tags=tags)
             ),
         })
 
         return context
 
     @staticmethod
-    def related_posts(page, value):
-        from v1.models.learn_page import AbstractFilterPage
+    def related_posts(page, value, tags=None):
+        """Return the posts related to a page, keyed by type of post.
 
-        def tag_set(related_page):
-            return set([tag.pk for tag in related_page.tags.all()])
+        Pass tags, a list of (pk, slug) pairs for the page's tags, to avoid
+        looking them up again.
+        """
+        from v1.models.learn_page import AbstractFilterPage
 
-        def match_all_topic_tags(queryset, page_tags):
+        def match_all_topic_tags(queryset, page_tag_ids):
             """Return pages that share every one of the current page's tags."""
-            current_tag_set = set([tag.pk for tag in page_tags])
-            return [page for page in queryset
-                    if current_tag_set.issubset(tag_set(page))]
+            # Each filter() on a multi-valued relation gets its own join, so
+            # chaining one per tag requires a page to carry all of them. This
+            # keeps the check in SQL instead of fetching tags for every page.
+            for tag_pk in frozenset(page_tag_ids):
+                queryset = queryset.filter(tags=tag_pk)
+            return queryset
 
         related_types = []
         related_items = {}
@@ -333,23 +372,33 @@ class RelatedPosts(blocks.StructBlock):
         if not related_types:
             return related_items
 
-        tags = page.tags.all()
+        if tags is None:
+            tags = page.tags.values_list('pk', 'slug')
+
+        # Only the primary keys of the page's tags are needed to filter on.
+        tag_ids = [pk for pk, _ in tags]
         and_filtering = value['and_filtering']
         specific_categories = value['specific_categories']
         limit = int(value['limit'])
         queryset = AbstractFilterPage.objects.live().exclude(
             id=page.id).order_by('-date_published').distinct().specific()
 
+        # Look up all of the parent pages at once rather than one per type.
+        parent_slugs = list(related_types)
+        if 'events' in related_types:
+            parent_slugs.append('archive-past-events')
+        parent_pages = get_pages_by_slug(parent_slugs)
+
         for parent in related_types:  # blog, newsroom or events
             # Include children of this slug that match at least 1 tag
-            children = Page.objects.child_of_q(Page.objects.get(slug=parent))
-            filters = children & Q(('tags__in', tags))
+            children = Page.objects.child_of_q(parent_pages[parent])
+            filters = children & Q(('tags__in', tag_ids))
 
             if parent == 'events':
                 # Include archived events matches
-                archive = Page.objects.get(slug='archive-past-events')
+                archive = parent_pages['archive-past-events']
                 children = Page.objects.child_of_q(archive)
-                filters |= children & Q(('tags__in', tags))
+                filters |= children & Q(('tags__in', tag_ids))
 
             if specific_categories:
                 # Filter by any additional categories specified
@@ -365,7 +414,10 @@ class RelatedPosts(blocks.StructBlock):
             if and_filtering:
                 # By default, we need to match at least one tag
                 # If specified in the admin, change this to match ALL tags
-                related_queryset = match_all_topic_tags(related_queryset, tags)
+                related_queryset = match_all_topic_tags(
+                    related_queryset,
+                    tag_ids
+                )
 
             related_items[parent.title()] = related_queryset[:limit]
 
@@ -373,7 +425,7 @@ class RelatedPosts(blocks.StructBlock):
         return {key: value for key, value in related_items.items() if value}
 
     @staticmethod
-    def view_more_url(page, request):
+    def view_more_url(page, request, tags=None):
         """Generate a URL to see more pages like this one.
         This method generates a link to the Activity Log page (which must
         exist and must have a unique site-wide slug of "activity-log") with
@@ -381,13 +433,19 @@ class RelatedPosts(blocks.StructBlock):
         /activity-log/?topics=foo&topics=bar&topics=baz
         If for some reason a page with slug "activity-log" does not exist,
         this method will raise Page.DoesNotExist.
+        Pass tags, a list of (pk, slug) pairs for the page's tags, to avoid
+        looking them up again.
         """
-        activity_log = Page.objects.get(slug='activity-log')
+        activity_log = get_pages_by_slug(['activity-log'])['activity-log']
         url = activity_log.get_url(request)
 
-        tags = urlencode([('topics', tag) for tag in page.tags.slugs()])
-        if tags:
-            url += '?' + tags
+        if tags is None:
+            tags = page.tags.values_list('pk', 'slug')
+
+        # Equivalent to urlencode(), without building a list of pairs first.
+        query = '&'.join('topics=' + quote_plus(slug) for _, slug in tags)
+        if query:
+            url += '?' + query
 
         return url
 
@@ -396,7 +454,29 @@ class RelatedPosts(blocks.StructBlock):
         template = '_includes/molecules/related-posts.html'
 
 
-class MainContactInfo(blocks.StructBlock):
+class BulkContactMixin(object):
+    """Look up the Contacts for many blocks with a single query.
+
+    For use with StructBlocks that have a 'contact' SnippetChooserBlock.
+    """
+
+    def bulk_to_python(self, values):
+        values = list(values)
+        contact_model = self.child_blocks['contact'].target_model
+        contacts_by_id = contact_model.objects.in_bulk(
+            {value.get('contact') for value in values}
+        )
+
+        struct_values = []
+        for value in values:
+            struct_value = self.to_python(dict(value, contact=None))
+            struct_value['contact'] = contacts_by_id.get(value.get('contact'))
+            struct_values.append(struct_value)
+
+        return struct_values
+
+
+class MainContactInfo(BulkContactMixin, blocks.StructBlock):
     contact = SnippetChooserBlock('v1.Contact')
     has_top_rule_line = blocks.BooleanBlock(
         default=False,
@@ -459,7 +539,7 @@ class RichTextTableInput(WidgetWithScript, forms.HiddenInput):
     def render(self, name, value, attrs=None):
         value = self.json_dict_apply(
             value,
-            expand_db_html
+            self.expand_cell_html
         )
 
         html = super(RichTextTableInput, self).render(name, value, attrs)
@@ -485,16 +565,35 @@ class RichTextTableInput(WidgetWithScript, forms.HiddenInput):
         except NameError:
             return value
 
+    @staticmethod
+    def expand_cell_html(cell):
+        # expand_db_html only rewrites <a> and <embed> tags, and most table
+        # cells are plain text, so skip its regular expressions when it has
+        # nothing to do.
+        if '<a' not in cell and '<embed' not in cell:
+            return cell
+
+        return expand_db_html(cell)
+
     @staticmethod
     def json_dict_apply(value, callback):
-        value = json.loads(value)
+        parsed = json.loads(value)
 
-        for row in (value or {}).get('data') or []:
+        rows = (parsed or {}).get('data')
+        if not rows:
+            return value
+
+        # Tables often repeat the same cell contents, for example in header
+        # rows, so only run the callback once for each distinct cell.
+        applied = {}
+        for row in rows:
             for i, cell in enumerate(row or []):
                 if cell:
-                    row[i] = callback(cell)
+                    if cell not in applied:
+                        applied[cell] = callback(cell)
+                    row[i] = applied[cell]
 
-        return json.dumps(value)
+        return json.dumps(parsed)
 
 
 class AtomicTableBlock(TableBlock):
@@ -510,19 +609,19 @@ class AtomicTableBlock(TableBlock):
         return new_value
 
     def get_has_data(self, value):
-        has_data = False
         if value and 'data' in value:
             first_row_index = 1 if value.get('first_row_is_table_header',
                                              None) else 0
             first_col_index = 1 if value.get('first_col_is_header',
                                              None) else 0
 
-            for row in value['data'][first_row_index:]:
-                for cell in row[first_col_index:]:
-                    if cell:
-                        has_data = True
-                        break
-        return has_data
+            # Stop looking as soon as any non-header cell has content.
+            return any(
+                cell
+                for row in value['data'][first_row_index:]
+                for cell in row[first_col_index:]
+            )
+        return False
 
     class Meta:
         default = None
@@ -558,9 +657,12 @@ class ModelBlock(blocks.StructBlock):
     ordering = None
     limit = None
 
+    @cached_property
+    def model_cls(self):
+        return apps.get_model(self.model)
+
     def get_queryset(self, value):
-        model_cls = apps.get_model(self.model)
-        qs = model_cls.objects.all()
+        qs = self.model_cls.objects.all()
 
         qs = self.filter_queryset(qs, value)
 
@@ -667,7 +769,7 @@ class ExpandableGroup(BaseExpandableGroup):
     expandables = blocks.ListBlock(Expandable())
 
 
-class ContactExpandable(blocks.StructBlock):
+class ContactExpandable(BulkContactMixin, blocks.StructBlock):
     contact = SnippetChooserBlock('v1.Contact')
 
     class Meta:
@@ -677,18 +779,6 @@ class ContactExpandable(blocks.StructBlock):
     class Media:
         js = ['expandable.js']
 
-    def bulk_to_python(self, values):
-        """Support bulk retrieval of Contacts to reduce database queries."""
-        contact_model = self.child_blocks['contact'].target_model
-        contacts_by_id = contact_model.objects.in_bulk(
-            value['contact'] for value in values
-        )
-
-        for value in values:
-            value['contact'] = contacts_by_id.get(value['contact'])
-
-        return [blocks.StructValue(self, value) for value in values]
-
 
 class ContactExpandableGroup(BaseExpandableGroup):
     expandables = blocks.ListBlock(ContactExpandable())
@@ -733,7 +823,22 @@ class ItemIntroduction(blocks.StructBlock):
         classname = 'block__flush-top'
 
 
-class FilterableList(BaseExpandable):
+# Topic filtering options that show the topics dropdown.
+_FILTERABLE_TOPIC_SORTS = frozenset((_SORT_FREQ, _SORT_ALPHA))
+
+# Post preview overrides for FilterableList, keyed by page type.
+#
+# Pending a much-needed refactor of that code, this logic is being placed
+# here to keep FilterableList logic in one place. It would be better if
+# this kind of configuration lived on custom Page models.
+_FILTERABLE_PAGE_TYPE_OVERRIDES = {
+    'cfpb-researchers': {'show_post_dates': False},
+    'consumer-reporting': {'show_post_dates': False},
+    'foia-freq-req-record': {'show_post_tags': False},
+}
+
+
+class FilterableList(v1_blocks.CachedTemplateMixin, BaseExpandable):
     title = blocks.BooleanBlock(default=True, required=False,
                                 label='Filter Title')
     no_posts_message = blocks.CharBlock(
@@ -804,13 +909,17 @@ class FilterableList(BaseExpandable):
         """Given a set of page IDs, return the list of filterable topics"""
         tags = Tag.objects.filter(
             v1_cfgovtaggedpages_items__content_object__id__in=filterable_page_ids  # noqa E501
-        ).values_list('slug', 'name')
+        )
 
-        sort_order = value.get('topic_filtering', 'sort_by_frequency')
-        if sort_order == 'sort_alphabetically':
-            return tags.distinct().order_by('name')
-        elif sort_order == 'sort_by_frequency':
-            return [tag for (tag, _) in Counter(tags).most_common()]
+        sort_order = value.get('topic_filtering', _SORT_FREQ)
+        if sort_order == _SORT_ALPHA:
+            return tags.values_list('slug', 'name').distinct().order_by('name')
+        elif sort_order == _SORT_FREQ:
+            # Let the database count the pages using each tag, rather than
+            # fetching a row for every tagged page and counting them here.
+            return tags.annotate(
+                page_count=Count('v1_cfgovtaggedpages_items')
+            ).order_by('-page_count', 'name').values_list('slug', 'name')
         else:
             return []
 
@@ -819,8 +928,7 @@ class FilterableList(BaseExpandable):
             value,
             parent_context=parent_context
         )
-        show_topics = value['topic_filtering'] == 'sort_by_frequency' or \
-            value['topic_filtering'] == 'sort_alphabetically'
+        show_topics = value['topic_filtering'] in _FILTERABLE_TOPIC_SORTS
         # Different instances of FilterableList need to render their post
         # previews differently depending on the page type they live on. By
         # default post dates and tags are always shown.
@@ -835,17 +943,7 @@ class FilterableList(BaseExpandable):
         # 'categories' block definition above. The page type choices are
         # defined in v1.util.ref.page_types.
         page_type = value['categories'].get('page_type')
-
-        # Pending a much-needed refactor of that code, this logic is being
-        # placed here to keep FilterableList logic in one place. It would be
-        # better if this kind of configuration lived on custom Page models.
-        page_type_overrides = {
-            'cfpb-researchers': {'show_post_dates': False},
-            'consumer-reporting': {'show_post_dates': False},
-            'foia-freq-req-record': {'show_post_tags': False},
-        }
-
-        context.update(page_type_overrides.get(page_type, {}))
+        context.update(_FILTERABLE_PAGE_TYPE_OVERRIDES.get(page_type, {}))
         return context
 
 
@@ -858,7 +956,7 @@ class VideoPlayerStructValue(blocks.StructValue):
             return thumbnail_image.get_rendition('original').url
 
 
-class VideoPlayer(blocks.StructBlock):
+class VideoPlayer(v1_blocks.CachedTemplateMixin, blocks.StructBlock):
     YOUTUBE_ID_HELP_TEXT = (
         'Enter the YouTube video ID, which is located at the end of the video '
         'URL, after "v=". For example, the video ID for '
@@ -880,7 +978,7 @@ class VideoPlayer(blocks.StructBlock):
     )
     thumbnail_image = images_blocks.ImageChooserBlock(
         required=False,
-        help_text=mark_safe(
+        help_text=(
             'Optional thumbnail image to show before and after the video '
             'plays. If the thumbnail image is not set here, the video player '
             'will default to showing the thumbnail that was set in (or '
@@ -889,6 +987,15 @@ class VideoPlayer(blocks.StructBlock):
     )
 
     def clean(self, value):
+        # Optional video players are usually left empty, in which case there
+        # is nothing for the child blocks to validate.
+        if (
+            not getattr(self.meta, 'required', True) and
+            not value.get('video_id') and
+            not value.get('thumbnail_image')
+        ):
+            return value
+
         cleaned = super().clean(value)
 
         errors = {}
@@ -924,7 +1031,9 @@ class VideoPlayer(blocks.StructBlock):
 
 
 class FeaturedContentStructValue(blocks.StructValue):
-    @property
+    # The template checks for links and then loops over them, so only build
+    # the list once per value.
+    @cached_property
     def links(self):
         # We want to pass a single list of links to the template when the
         # FeaturedContent organism is rendered. So we consolidate any links
@@ -944,17 +1053,16 @@ class FeaturedContentStructValue(blocks.StructValue):
             })
 
         # Normalize any child Hyperlink atoms and filter empty links.
-        for hyperlink in self.get('links') or []:
-            url = hyperlink.get('url')
-            text = hyperlink.get('text')
-
-            if url and text:
-                links.append({'url': url, 'text': text})
+        links += [
+            {'url': hyperlink['url'], 'text': hyperlink['text']}
+            for hyperlink in self.get('links') or ()
+            if hyperlink.get('url') and hyperlink.get('text')
+        ]
 
         return links
 
 
-class FeaturedContent(blocks.StructBlock):
+class FeaturedContent(v1_blocks.CachedTemplateMixin, blocks.StructBlock):
     heading = blocks.CharBlock()
     body = blocks.RichTextBlock()
 
@@ -970,6 +1078,21 @@ class FeaturedContent(blocks.StructBlock):
 
     video = VideoPlayer(required=False)
 
+    def bulk_to_python(self, values):
+        """Support bulk retrieval of post pages to reduce database queries."""
+        values = list(values)
+        posts = self.child_blocks['post'].bulk_to_python(
+            [value.get('post') for value in values]
+        )
+
+        struct_values = []
+        for value, post in zip(values, posts):
+            struct_value = self.to_python(dict(value, post=None))
+            struct_value['post'] = post
+            struct_values.append(struct_value)
+
+        return struct_values
+
     class Meta:
         template = '_includes/organisms/featured-content.html'
         icon = 'doc-full-inverse'
@@ -981,28 +1104,33 @@ class FeaturedContent(blocks.StructBlock):
         js = ['featured-content-module.js']
 
 
-class ChartBlock(blocks.StructBlock):
+_CHART_TYPE_CHOICES = (
+    ('bar', 'Bar | % y-axis values'),
+    ('line', 'Line | millions/billions y-axis values'),
+    ('line-index', 'Line-Index | integer y-axis values'),
+    ('tile_map', 'Tile Map | grid-like USA map'),
+)
+
+_CHART_COLOR_SCHEME_CHOICES = (
+    ('blue', 'Blue'),
+    ('gold', 'Gold'),
+    ('green', 'Green'),
+    ('navy', 'Navy'),
+    ('neutral', 'Neutral'),
+    ('purple', 'Purple'),
+    ('teal', 'Teal'),
+)
+
+
+class ChartBlock(v1_blocks.CachedTemplateMixin, blocks.StructBlock):
     title = blocks.CharBlock(required=True)
     # todo: make radio buttons
     chart_type = blocks.ChoiceBlock(
-        choices=[
-            ('bar', 'Bar | % y-axis values'),
-            ('line', 'Line | millions/billions y-axis values'),
-            ('line-index', 'Line-Index | integer y-axis values'),
-            ('tile_map', 'Tile Map | grid-like USA map'),
-        ],
+        choices=_CHART_TYPE_CHOICES,
         required=True
     )
     color_scheme = blocks.ChoiceBlock(
-        choices=[
-            ('blue', 'Blue'),
-            ('gold', 'Gold'),
-            ('green', 'Green'),
-            ('navy', 'Navy'),
-            ('neutral', 'Neutral'),
-            ('purple', 'Purple'),
-            ('teal', 'Teal'),
-        ],
+        choices=_CHART_COLOR_SCHEME_CHOICES,
         required=False,
         help_text='Chart\'s color scheme. See '
                   '"https://github.com/cfpb/cfpb-chart-builder'
@@ -1054,7 +1182,7 @@ class ChartBlock(blocks.StructBlock):
         js = ['chart.js']
 
 
-class MortgageChartBlock(blocks.StructBlock):
+class MortgageChartBlock(v1_blocks.CachedTemplateMixin, blocks.StructBlock):
     content_block = blocks.RichTextBlock()
     title = blocks.CharBlock(required=True, classname="title")
     description = blocks.CharBlock(
@@ -1090,7 +1218,18 @@ class MortgageMapBlock(MortgageChartBlock):
         js = ['mortgage-performance-trends.js']
 
 
-class ResourceList(blocks.StructBlock):
+_RESOURCE_LIST_COLUMN_WIDTH_CHOICES = (
+    ('70', '70%'),
+    ('66', '66%'),
+    ('60', '60%'),
+    ('50', '50%'),
+    ('40', '40%'),
+    ('33', '33%'),
+    ('30', '30%'),
+)
+
+
+class ResourceList(v1_blocks.CachedTemplateMixin, blocks.StructBlock):
     heading = blocks.CharBlock(required=False)
     body = blocks.RichTextBlock(required=False)
     has_top_rule_line = blocks.BooleanBlock(
@@ -1104,15 +1243,7 @@ class ResourceList(blocks.StructBlock):
         required=False,
         help_text='Choose the width in % that you wish to set '
                   'the Actions column in a resource list.',
-        choices=[
-            ('70', '70%'),
-            ('66', '66%'),
-            ('60', '60%'),
-            ('50', '50%'),
-            ('40', '40%'),
-            ('33', '33%'),
-            ('30', '30%'),
-        ],
+        choices=_RESOURCE_LIST_COLUMN_WIDTH_CHOICES,
     )
     show_thumbnails = blocks.BooleanBlock(
         required=False,
@@ -1147,7 +1278,7 @@ class ResourceList(blocks.StructBlock):
         template = '_includes/organisms/resource-list.html'
 
 
-class DataSnapshot(blocks.StructBlock):
+class DataSnapshot(v1_blocks.CachedTemplateMixin, blocks.StructBlock):
     """ A basic Data Snapshot object. """
     # Market key corresponds to market short name for lookup
     market_key = blocks.CharBlock(
@@ -1,3 +1,6 @@
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils.functional import cached_property
 from django.utils.module_loading import import_string
 from django.utils.safestring import SafeText, mark_safe
 from django.utils.text import slugify
@@ -10,6 +13,38 @@ from bs4 import BeautifulSoup
 from v1.util.util import get_unique_id
 
 
+class CachedTemplateMixin(object):
+    """
+    Mixin for blocks that resolve their template once instead of per render.
+
+    Wagtail looks up a block's Meta.template through the template engines
+    every time the block is rendered. Block instances last as long as their
+    StreamField definition, so the resolved template can be kept on the
+    block. As with Django's cached template loader, this is skipped when
+    DEBUG is on so that template changes are picked up.
+    """
+    @cached_property
+    def compiled_template(self):
+        return get_template(self.meta.template)
+
+    def render(self, value, context=None):
+        if settings.DEBUG:
+            return super(CachedTemplateMixin, self).render(
+                value,
+                context=context
+            )
+
+        if context is None:
+            new_context = self.get_context(value)
+        else:
+            new_context = self.get_context(
+                value,
+                parent_context=dict(context)
+            )
+
+        return mark_safe(self.compiled_template.render(new_context))
+
+
 class AbstractFormBlock(blocks.StructBlock):
     """
     Block class to be subclassed for blocks that involve form handling.
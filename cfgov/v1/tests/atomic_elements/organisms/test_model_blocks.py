@@ -1,6 +1,8 @@
 from django.contrib.auth.models import User
 from django.test import TestCase
 
+from mock import patch
+
 from v1.atomic_elements.organisms import ModelBlock
 
 
@@ -99,3 +101,14 @@ class ModelBlockTestCase(UserModelMixin, TestCase):
             [model.username for model in block.get_queryset(None)],
             ['admin', 'chico']
         )
+
+    def test_model_cls_resolved_once(self):
+        class UserBlock(ModelBlock):
+            model = 'auth.User'
+
+        block = UserBlock()
+        self.assertIs(block.model_cls, User)
+
+        with patch('v1.atomic_elements.organisms.apps.get_model') as get_model:
+            block.get_queryset(None)
+            get_model.assert_not_called()
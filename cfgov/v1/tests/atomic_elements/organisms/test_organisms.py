@@ -1,13 +1,16 @@
 from django.core.exceptions import ValidationError
 from django.test import Client, RequestFactory, SimpleTestCase, TestCase
 
-from wagtail.core.blocks import StreamValue
+from wagtail.core.blocks import StreamBlock, StreamValue
 from wagtail.core.models import Site
 from wagtail.images.tests.utils import get_test_image_file
 
+import mock
+
 from scripts import _atomic_helpers as atomic
 from v1.atomic_elements.organisms import (
-    FeaturedContent, InfoUnitGroup, TableBlock, VideoPlayer
+    ContactExpandable, FeaturedContent, InfoUnitGroup, MainContactInfo,
+    SidebarContactInfo, TableBlock, VideoPlayer
 )
 from v1.models import (
     BrowsePage, CFGOVImage, Contact, LandingPage, LearnPage, Resource,
@@ -387,6 +390,72 @@ class OrganismsTestCase(TestCase):
         self.assertContains(response, 'u-w40pct"')
 
 
+class MainContactInfoTests(TestCase):
+    def test_bulk_to_python(self):
+        Contact.objects.bulk_create(
+            Contact(pk=i, heading=str(i))
+            for i in range(3)
+        )
+
+        class TestStreamBlock(StreamBlock):
+            contact = MainContactInfo()
+            sidebar_contact = SidebarContactInfo()
+
+        block = TestStreamBlock()
+        value = StreamValue(
+            block,
+            [
+                {'type': 'contact', 'value': {'contact': 0}},
+                {'type': 'contact', 'value': {'contact': 1}},
+                {'type': 'sidebar_contact', 'value': {'contact': 2}},
+            ],
+            is_lazy=True
+        )
+
+        # Contacts are retrieved with a single query per block type, instead
+        # of one query per block.
+        with self.assertNumQueries(2):
+            headings = [child.value['contact'].heading for child in value]
+
+        self.assertEqual(headings, ['0', '1', '2'])
+
+    def test_bulk_to_python_leaves_raw_values_alone(self):
+        contact = Contact.objects.create(heading='Contact')
+        values = [{'contact': contact.pk}, {'has_top_rule_line': True}]
+
+        struct_values = MainContactInfo().bulk_to_python(values)
+
+        self.assertEqual(
+            values,
+            [{'contact': contact.pk}, {'has_top_rule_line': True}]
+        )
+        self.assertEqual(struct_values[0]['contact'], contact)
+        self.assertIsNone(struct_values[1]['contact'])
+        self.assertIs(struct_values[0]['has_top_rule_line'], False)
+        self.assertIs(struct_values[1]['has_top_rule_line'], True)
+
+
+class ContactExpandableTests(TestCase):
+    def test_bulk_to_python_looks_up_each_contact_once(self):
+        Contact.objects.bulk_create(
+            Contact(pk=i, heading=str(i))
+            for i in range(2)
+        )
+        values = [{'contact': 0}, {'contact': 1}, {'contact': 0}]
+
+        with mock.patch.object(
+            Contact.objects, 'in_bulk', wraps=Contact.objects.in_bulk
+        ) as in_bulk:
+            struct_values = ContactExpandable().bulk_to_python(values)
+
+        in_bulk.assert_called_once_with({0, 1})
+        self.assertEqual(
+            [value['contact'].heading for value in struct_values],
+            ['0', '1', '0']
+        )
+        self.assertEqual(values[0], {'contact': 0})
+
+
 class FeaturedContentTests(TestCase):
     def setUp(self):
         self.page = Site.objects.get(is_default_site=True).root_page
@@ -413,6 +482,42 @@ class FeaturedContentTests(TestCase):
             {'url': '/bar/', 'text': 'Another link'},
         ])
 
+    def test_bulk_to_python(self):
+        class TestStreamBlock(StreamBlock):
+            featured_content = FeaturedContent()
+
+        block = TestStreamBlock()
+        value = StreamValue(
+            block,
+            [
+                {
+                    'type': 'featured_content',
+                    'value': {'heading': str(i), 'post': self.page.pk},
+                }
+                for i in range(3)
+            ],
+            is_lazy=True
+        )
+
+        # A single query retrieves the post for all three blocks.
+        with self.assertNumQueries(1):
+            posts = [child.value['post'] for child in value]
+
+        self.assertEqual(posts, [self.page] * 3)
+
+    def test_links_built_once(self):
+        block = FeaturedContent()
+        value = block.to_python({
+            'post': self.page.pk,
+            'show_post_link': True,
+            'links': [],
+        })
+
+        links = value.links
+
+        with self.assertNumQueries(0):
+            self.assertIs(value.links, links)
+
     def test_render(self):
         block = FeaturedContent()
         value = block.to_python({
@@ -560,6 +665,15 @@ class TestInfoUnitGroup(TestCase):
         with self.assertRaises(ValidationError):
             block.clean(value)
 
+    def test_2575_with_no_info_units_ok(self):
+        block = InfoUnitGroup()
+        value = block.to_python({'format': '25-75', 'info_units': []})
+
+        try:
+            block.clean(value)
+        except ValidationError:  # pragma: nocover
+            self.fail('25-75 group with no info units validates')
+
 
 class VideoPlayerTests(SimpleTestCase):
     def test_video_id_required_by_default(self):
@@ -578,6 +692,18 @@ class VideoPlayerTests(SimpleTestCase):
         except ValidationError as e:  # pragma: nocover
             self.fail('Optional VideoPlayers should not require sub-fields')
 
+    def test_empty_optional_video_player_skips_child_validation(self):
+        block = VideoPlayer(required=False)
+        value = block.to_python({})
+
+        with mock.patch.object(
+            block.child_blocks['video_id'],
+            'clean'
+        ) as clean_video_id:
+            self.assertEqual(block.clean(value), value)
+
+        clean_video_id.assert_not_called()
+
     def test_invalid_video_id(self):
         block = VideoPlayer()
         value = block.to_python({'video_url': 'Invalid YouTube ID'})
@@ -353,6 +353,16 @@ class RelatedPostsTestCase(TestCase):
         self.assertEqual(related_posts['Events'][0], self.events_child1)
         self.assertEqual(related_posts['Newsroom'][0], self.newsroom_child1)
 
+    def test_related_posts_missing_parent_raises_does_not_exist(self):
+        self.archive_events_parent.delete()
+        self.block_value['relate_events'] = True
+
+        with self.assertRaises(Page.DoesNotExist):
+            RelatedPosts.related_posts(
+                self.page_with_authors,
+                self.block_value
+            )
+
     def test_related_posts_rendering(self):
         block_value = {
             'and_filtering': False,
@@ -415,3 +425,72 @@ class TestGenerateViewMoreUrl(TestCase):
             RelatedPosts.view_more_url(page, self.request),
             '/activity-log/?topics=bar&topics=foo'
         )
+
+    def test_tags_passed_in_are_not_looked_up_again(self):
+        self._create_activity_log_page()
+
+        page = CFGOVPage(title='test')
+        self.root.add_child(instance=page)
+
+        # Look up the site for this request ahead of time.
+        RelatedPosts.view_more_url(page, self.request)
+
+        # Only the Activity Log page itself needs to be looked up.
+        with self.assertNumQueries(1):
+            url = RelatedPosts.view_more_url(
+                page,
+                self.request,
+                tags=[(1, 'foo'), (2, 'bar')]
+            )
+
+        self.assertEqual(url, '/activity-log/?topics=foo&topics=bar')
+
+    def test_deleted_activity_log_page_is_not_found(self):
+        self._create_activity_log_page()
+
+        page = CFGOVPage(title='test')
+        self.root.add_child(instance=page)
+
+        RelatedPosts.view_more_url(page, self.request)
+        Page.objects.get(slug='activity-log').delete()
+
+        with self.assertRaises(Page.DoesNotExist):
+            RelatedPosts.view_more_url(page, self.request)
+
+    def test_moved_activity_log_page_url_is_current(self):
+        self._create_activity_log_page()
+        section = CFGOVPage(title='Section', slug='section')
+        self.root.add_child(instance=section)
+
+        page = CFGOVPage(title='test')
+        self.root.add_child(instance=page)
+
+        RelatedPosts.view_more_url(page, self.request)
+        Page.objects.get(slug='activity-log').move(
+            section, pos='last-child'
+        )
+
+        self.assertEqual(
+            RelatedPosts.view_more_url(page, self.request),
+            '/section/activity-log/'
+        )
+
+    def test_activity_log_url_follows_moved_ancestor(self):
+        section = CFGOVPage(title='Section', slug='section')
+        self.root.add_child(instance=section)
+        section.add_child(
+            instance=CFGOVPage(title='Activity log', slug='activity-log')
+        )
+        other = CFGOVPage(title='Other', slug='other')
+        self.root.add_child(instance=other)
+
+        page = CFGOVPage(title='test')
+        self.root.add_child(instance=page)
+
+        RelatedPosts.view_more_url(page, self.request)
+        Page.objects.get(pk=section.pk).move(other, pos='last-child')
+
+        self.assertEqual(
+            RelatedPosts.view_more_url(page, self.request),
+            '/other/section/activity-log/'
+        )
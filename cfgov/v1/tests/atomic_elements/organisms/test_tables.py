@@ -5,6 +5,8 @@ from django.test import TestCase
 from wagtail.core.models import Site
 from wagtail.tests.testapp.models import SimplePage
 
+import mock
+
 from v1.atomic_elements.organisms import AtomicTableBlock, RichTextTableInput
 
 
@@ -42,6 +44,54 @@ class TestRichTextTableInput(TestCase):
             }
         )
 
+    def test_json_dict_apply_calls_callback_once_per_distinct_cell(self):
+        value = {
+            'data': [
+                ['a', 'b'],
+                ['a', 'b'],
+                ['a', 'c'],
+            ]
+        }
+        calls = []
+
+        def callback(cell):
+            calls.append(cell)
+            return cell.upper()
+
+        applied_value = RichTextTableInput.json_dict_apply(
+            json.dumps(value),
+            callback
+        )
+
+        self.assertEqual(sorted(calls), ['a', 'b', 'c'])
+        self.assertEqual(
+            json.loads(applied_value)['data'],
+            [['A', 'B'], ['A', 'B'], ['A', 'C']]
+        )
+
+    def test_expand_cell_html_plain_text_unchanged(self):
+        with mock.patch(
+            'v1.atomic_elements.organisms.expand_db_html'
+        ) as expand_db_html:
+            self.assertEqual(
+                RichTextTableInput.expand_cell_html('Plain text'),
+                'Plain text'
+            )
+
+        expand_db_html.assert_not_called()
+
+    def test_expand_cell_html_expands_links(self):
+        page = SimplePage(title='title', slug='slug', content='content')
+        default_site = Site.objects.get(is_default_site=True)
+        default_site.root_page.add_child(instance=page)
+
+        self.assertIn(
+            'href="/slug/"',
+            RichTextTableInput.expand_cell_html(
+                '<a linktype="page" id="{}">Link</a>'.format(page.pk)
+            )
+        )
+
 
 class TestAtomicTableBlock(TestCase):
     def test_render_with_data(self):
@@ -75,3 +125,22 @@ class TestAtomicTableBlock(TestCase):
         block = AtomicTableBlock()
         result = block.render(value)
         self.assertIn(u'H\xebader', result)
+
+    def test_get_has_data_ignores_headers(self):
+        block = AtomicTableBlock()
+        self.assertFalse(block.get_has_data({
+            'data': [['Header 1', 'Header 2'], ['Row header', '']],
+            'first_row_is_table_header': True,
+            'first_col_is_header': True,
+        }))
+
+    def test_get_has_data_finds_data_in_any_row(self):
+        block = AtomicTableBlock()
+        self.assertTrue(block.get_has_data({
+            'data': [['', None], ['', ''], [None, 'data']],
+        }))
+
+    def test_get_has_data_no_data(self):
+        block = AtomicTableBlock()
+        self.assertFalse(block.get_has_data(None))
+        self.assertFalse(block.get_has_data({}))
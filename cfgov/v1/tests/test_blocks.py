@@ -1,11 +1,16 @@
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.template.loader import get_template
+from django.test import TestCase, override_settings
 from django.test.client import RequestFactory
 from django.utils.safestring import SafeText
 
+from wagtail.core import blocks
+
 import mock
 
-from v1.blocks import AbstractFormBlock, AnchorLink, PlaceholderCharBlock
+from v1.blocks import (
+    AbstractFormBlock, AnchorLink, CachedTemplateMixin, PlaceholderCharBlock
+)
 
 
 class TestAbstractFormBlock(TestCase):
@@ -148,3 +153,36 @@ class TestPlaceholderBlock(TestCase):
         html = '<input id="foo" /><input id="bar" />'
         with self.assertRaises(ValueError):
             PlaceholderCharBlock.replace_placeholder(html, 'a')
+
+
+class CachedTemplateBlock(CachedTemplateMixin, blocks.StructBlock):
+    text = blocks.CharBlock()
+
+    class Meta:
+        template = '_includes/organisms/well.html'
+
+
+class TestCachedTemplateMixin(TestCase):
+    def test_template_resolved_once(self):
+        block = CachedTemplateBlock()
+        value = block.to_python({'text': 'foo'})
+
+        with mock.patch(
+            'v1.blocks.get_template',
+            wraps=get_template
+        ) as patched_get_template:
+            first = block.render(value)
+            second = block.render(value)
+
+        patched_get_template.assert_called_once_with(
+            '_includes/organisms/well.html'
+        )
+        self.assertIsInstance(first, SafeText)
+        self.assertEqual(first, second)
+
+    @override_settings(DEBUG=True)
+    def test_template_not_cached_in_debug(self):
+        block = CachedTemplateBlock()
+        value = block.to_python({'text': 'foo'})
+        block.render(value)
+        self.assertNotIn('compiled_template', block.__dict__)